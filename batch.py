@@ -0,0 +1,96 @@
+"""
+Batched solves of the node solvers.
+
+The `rate_*` / `balance_*` equations are plain arithmetic on the store and
+the solver's parameters, so they work just as well when the store holds
+NumPy arrays of shape (N,) and any parameter is an array broadcastable to
+it. One call then evaluates the residuals of N candidate states or N
+parameter sets, and the solvers below drive all N to equilibrium at once:
+
+    env = SphereInSphere()
+    env.Q_heatgen = np.linspace(100, 5000, 100000)
+    store, iterations = newton_batch(env, batch_store(env, 100000))
+
+Store values should be floats: integer arrays overflow in T ** 4.
+"""
+import numpy as np
+
+
+def batch_store(env, n, store=None):
+    """env.initial_store() (or store) repeated into float arrays of length n."""
+    if store is None:
+        store = env.initial_store()
+    return {key: np.full(n, val, dtype=float) for key, val in store.items()}
+
+
+def residuals(env, store):
+    """Net joules per second gained by every node: shape (nodes, N)."""
+    return np.array(np.broadcast_arrays(*[
+        getattr(env, name)(store) for name in env.balances.values()
+    ]), dtype=float)
+
+
+def relax_batch(env, store, gain=1e-6, tol=1e-6, max_steps=10000000):
+    """
+    Vectorised version of the solvers' own solve(): every step adds
+    balance * gain to each node's temperature, for all N stores at once.
+
+    Returns (store, steps); stops when every residual is below tol.
+    """
+    store = {key: np.array(val, dtype=float) for key, val in store.items()}
+    for step in range(max_steps):
+        gains = residuals(env, store)
+        if np.max(np.abs(gains)) < tol:
+            return store, step
+        for key, gain_w in zip(env.balances, gains):
+            store[key] += gain_w * gain
+    return store, max_steps
+
+
+def newton_batch(env, store, tol=1e-6, max_iter=50):
+    """
+    Damped Newton on the balance equations of all N stores at once.
+
+    The (N, nodes, nodes) jacobians are forward differences, one batched
+    residual call per node. Returns (store, iterations); iterations is an
+    int array giving the iteration each configuration converged at, -1 for
+    those that did not (they keep their last iterate).
+    """
+    keys = list(env.balances)
+    x = np.array(np.broadcast_arrays(*[np.asarray(store[key], dtype=float) for key in keys]))
+
+    def fun(x):
+        return residuals(env, dict(zip(keys, x)))
+
+    f = fun(x)
+    n_nodes, n = x.shape
+    iterations = np.full(n, -1)
+    for it in range(max_iter + 1):
+        converged = np.max(np.abs(f), axis=0) < tol
+        iterations[converged & (iterations < 0)] = it
+        if np.all(converged) or it == max_iter:
+            break
+
+        jac = np.empty((n, n_nodes, n_nodes))
+        for i in range(n_nodes):
+            h = 1e-7 * np.maximum(1.0, np.abs(x[i]))
+            xh = x.copy()
+            xh[i] += h
+            jac[:, :, i] = ((fun(xh) - f) / h).T
+        dx = np.linalg.solve(jac, -f.T[:, :, None])[:, :, 0].T
+        dx[:, converged] = 0
+
+        # halve the step of every configuration whose residual did not drop
+        # or whose temperatures went negative
+        norm = np.linalg.norm(f, axis=0)
+        lam = np.ones(n)
+        for _ in range(12):
+            x_new = x + lam * dx
+            f_new = fun(x_new)
+            bad = (np.linalg.norm(f_new, axis=0) >= norm) & ~converged | np.any(x_new <= 0, axis=0)
+            if not np.any(bad):
+                break
+            lam[bad] /= 2
+        x, f = x_new, f_new
+
+    return dict(zip(keys, x)), iterations
@@ -10,6 +10,21 @@ class Solvemer:
     A_box_emits = 0.006134
     E_chamber_to_box = 2.4315
 
+    # store key -> balance equation driving it
+    balances = {
+        'T_wire': 'balance_wire',
+        'T_box': 'balance_box',
+    }
+
+    # rates that bring energy in from outside / take it out of the system
+    sources = (
+        'rate_circuit_in',
+        'rate_chamber_in',
+    )
+    sinks = (
+        'rate_box_loss',
+    )
+
     # equations
     def rate_wire_out(self, store):
         return self.s_boltzmann * self.A_wire_to_box * store['T_wire'] ** 4
@@ -23,6 +38,16 @@ class Solvemer:
     def rate_box_in(self, store):
         return self.E_chamber_to_box + self.s_boltzmann * self.A_wire_to_box * store['T_wire'] ** 4
 
+    def rate_circuit_in(self, store):
+        return self.E_circuit_in
+
+    def rate_chamber_in(self, store):
+        return self.E_chamber_to_box
+
+    def rate_box_loss(self, store):
+        # box radiation that does not land on the wire
+        return self.s_boltzmann * (self.A_box_emits - self.A_wire_to_box) * store['T_box'] ** 4
+
     def balance_wire(self, store):
         inp_left = self.rate_wire_in(store)
         loss_left = self.rate_wire_out(store)
@@ -33,11 +58,14 @@ class Solvemer:
         loss_right = self.rate_box_out(store)
         return inp_right - loss_right
 
-    def solve(self):
-        store = {
+    def initial_store(self):
+        return {
             'T_wire': 297,
             'T_box': 297,
         }
+
+    def solve(self):
+        store = self.initial_store()
         step = 0
         while True:
             joules_gain_wire = self.balance_wire(store)
@@ -63,6 +91,7 @@ class Solvemer:
             store = new_store
 
 
-env = Solvemer()
+if __name__ == '__main__':
+    env = Solvemer()
 
-env.solve()
+    env.solve()
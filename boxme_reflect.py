@@ -14,6 +14,22 @@ class Solvemer:
     refl_box = 0.9
     pct_reflect_absorbed_wire = 0.11
 
+    # store key -> balance equation driving it
+    balances = {
+        'T_wire': 'balance_wire',
+        'T_box': 'balance_box',
+    }
+
+    # rates that bring energy in from outside / take it out of the system
+    sources = (
+        'rate_circuit_in',
+        'rate_chamber_in',
+    )
+    sinks = (
+        'rate_box_loss',
+        'rate_wire_loss',
+    )
+
     # equations
     def rate_wire_out(self, store):
         return (
@@ -38,6 +54,23 @@ class Solvemer:
             + self.s_boltzmann * self.em_box * self.A_wire_to_box * store['T_wire'] ** 4
         )
 
+    def rate_circuit_in(self, store):
+        return self.E_circuit_in
+
+    def rate_chamber_in(self, store):
+        return self.E_chamber_to_box
+
+    def rate_box_loss(self, store):
+        # box radiation that does not land on the wire
+        return self.s_boltzmann * self.em_box * (self.A_box_emits - self.A_wire_to_box) * store['T_box'] ** 4
+
+    def rate_wire_loss(self, store):
+        # wire radiation neither absorbed by the box nor reflected back onto the wire
+        return (
+            (1 - self.em_box - self.pct_reflect_absorbed_wire * self.refl_box)
+            * self.s_boltzmann * self.A_wire_to_box * store['T_wire'] ** 4
+        )
+
     def balance_wire(self, store):
         inp_left = self.rate_wire_in(store)
         loss_left = self.rate_wire_out(store)
@@ -48,11 +81,14 @@ class Solvemer:
         loss_right = self.rate_box_out(store)
         return inp_right - loss_right
 
-    def solve(self):
-        store = {
+    def initial_store(self):
+        return {
             'T_wire': 297,
             'T_box': 297,
         }
+
+    def solve(self):
+        store = self.initial_store()
         step = 0
         while True:
             joules_gain_wire = self.balance_wire(store)
@@ -78,6 +114,7 @@ class Solvemer:
             store = new_store
 
 
-env = Solvemer()
+if __name__ == '__main__':
+    env = Solvemer()
 
-env.solve()
+    env.solve()
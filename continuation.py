@@ -0,0 +1,287 @@
+"""
+Continuation driver for the node solvers.
+
+Walks one parameter of a solver (e.g. `k_plate` of WallPlateSpace from
+styrofoam to copper, or `Q_heatgen` of SphereInSphere) across a range and
+returns the whole equilibrium curve. Every point is seeded from the previous
+converged store (extrapolated along the curve) and polished with Newton on
+the solver's `balance_*` equations, so the scan costs a few Newton iterations
+per point instead of a cold relaxation from `T = 3` or `288` each time.
+
+The step along the curve adapts to how hard Newton had to work on the last
+point: a quick converge grows the step, a slow one or a failure shrinks it.
+"""
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+import boxme
+import boxme_reflect
+from solver_one_plate import OnePlateWithConduction
+from solver_sphere_in_sphere import SphereInSphere
+from solver_two_plates import TwoPlatesWithConduction
+from wall_plate_space import WallPlateSpace
+
+
+MODELS = {
+    'one_plate': OnePlateWithConduction,
+    'two_plates': TwoPlatesWithConduction,
+    'sphere_in_sphere': SphereInSphere,
+    'wall_plate_space': WallPlateSpace,
+    'boxme': boxme.Solvemer,
+    'boxme_reflect': boxme_reflect.Solvemer,
+}
+
+
+def residual(env, store):
+    """Net joules per second gained by each node of the store."""
+    return np.array([getattr(env, name)(store) for name in env.balances.values()], dtype=float)
+
+
+def to_store(env, x):
+    """Turn a vector of node temperatures back into a store dict."""
+    return {key: float(val) for key, val in zip(env.balances, x)}
+
+
+def from_store(env, store):
+    """Turn a store dict into a vector of node temperatures."""
+    return np.array([store[key] for key in env.balances], dtype=float)
+
+
+def jacobian(fun, x, f0):
+    """Forward-difference jacobian of fun around x, given f0 = fun(x)."""
+    jac = np.empty((len(f0), len(x)))
+    for i in range(len(x)):
+        h = 1e-7 * max(1.0, abs(x[i]))
+        xh = x.copy()
+        xh[i] += h
+        jac[:, i] = (fun(xh) - f0) / h
+    return jac
+
+
+def newton(fun, x, tol=1e-6, max_iter=30):
+    """
+    Damped Newton on fun(x) = 0.
+
+    Returns (x, iterations); iterations is None if it did not converge.
+    """
+    x = np.array(x, dtype=float)
+    f = fun(x)
+    for it in range(1, max_iter + 1):
+        if np.max(np.abs(f)) < tol:
+            return x, it - 1
+
+        try:
+            dx = np.linalg.solve(jacobian(fun, x, f), -f)
+        except np.linalg.LinAlgError:
+            return x, None
+
+        # halve the step until the residual drops and temperatures stay positive
+        norm = np.linalg.norm(f)
+        lam = 1.0
+        while True:
+            x_new = x + lam * dx
+            if np.all(x_new > 0) or lam < 1e-3:
+                f_new = fun(x_new)
+                if np.linalg.norm(f_new) < (1 - 1e-4 * lam) * norm or lam < 1e-3:
+                    break
+            lam /= 2
+
+        x, f = x_new, f_new
+        if np.max(np.abs(lam * dx) / (1 + np.abs(x))) < 1e-13:
+            return x, it
+
+    if np.max(np.abs(f)) < tol:
+        return x, max_iter
+    return x, None
+
+
+def solve(env, store=None, tol=1e-6, max_iter=30):
+    """
+    Solve the balance equations of env from store (default: env.initial_store()).
+
+    Returns (store, iterations); iterations is None if it did not converge.
+    """
+    if store is None:
+        store = env.initial_store()
+    x, iterations = newton(
+        lambda x: residual(env, to_store(env, x)),
+        from_store(env, store),
+        tol=tol,
+        max_iter=max_iter,
+    )
+    return to_store(env, x), iterations
+
+
+@dataclass
+class CurvePoint:
+    param: float
+    store: dict
+    iterations: int
+
+
+class Continuation:
+    """
+    Walk env.<param> from start to stop along the equilibrium curve.
+
+    method='natural' steps the parameter and solves for the store;
+    method='arclength' steps along the curve itself (pseudo-arclength), which
+    also gets around folds where the parameter turns back. Past a fold the
+    parameter runs backwards; the scan ends when it leaves the range at
+    either end, so it may finish back at start rather than at stop.
+    With log=True the parameter is stepped in log10, which suits ranges
+    like styrofoam-to-copper conductivities.
+    Steps are fractions of the (log-)parameter range.
+    """
+
+    def __init__(self, env, param, start, stop, method='natural', log=False,
+                 step=0.05, min_step=1e-6, max_step=0.1, tol=1e-6, max_iter=30):
+        if method not in ('natural', 'arclength'):
+            raise ValueError("method must be 'natural' or 'arclength', got %r" % method)
+        if log and (start <= 0 or stop <= 0):
+            raise ValueError("log continuation needs a positive parameter range")
+
+        self.env = env
+        self.param = param
+        self.start = start
+        self.stop = stop
+        self.method = method
+        self.log = log
+        self.step = step
+        self.min_step = min_step
+        self.max_step = max_step
+        self.tol = tol
+        self.max_iter = max_iter
+
+        # total balance evaluations, to compare against cold solves
+        self.evaluations = 0
+
+    def param_at(self, u):
+        """Parameter value at fraction u of the range."""
+        if u >= 1.0:
+            return self.stop
+        if self.log:
+            return 10 ** (math.log10(self.start) + u * (math.log10(self.stop) - math.log10(self.start)))
+        return self.start + u * (self.stop - self.start)
+
+    def residual_at(self, x, u):
+        setattr(self.env, self.param, self.param_at(u))
+        self.evaluations += 1
+        return residual(self.env, to_store(self.env, x))
+
+    def solve_at(self, x, u):
+        return newton(lambda x: self.residual_at(x, u), x, tol=self.tol, max_iter=self.max_iter)
+
+    def adapt(self, ds, iterations):
+        """Grow the step after an easy solve, shrink it after a hard one."""
+        if iterations <= 3:
+            return min(ds * 1.5, self.max_step)
+        if iterations >= 8:
+            return max(ds * 0.5, self.min_step)
+        return ds
+
+    def __iter__(self):
+        original = getattr(self.env, self.param)
+        try:
+            yield from self.walk()
+        finally:
+            # every evaluation sets the parameter; hand env back as it came
+            setattr(self.env, self.param, original)
+
+    def walk(self):
+        x, iterations = self.solve_at(from_store(self.env, self.env.initial_store()), 0.0)
+        if iterations is None:
+            raise RuntimeError("no equilibrium found at %s=%g" % (self.param, self.start))
+        yield CurvePoint(self.param_at(0.0), to_store(self.env, x), iterations)
+
+        # curve coordinates are scaled so temperatures and the range fraction weigh alike
+        scale = np.maximum(1.0, np.abs(x))
+        u = 0.0
+        ds = self.step
+        prev = None
+
+        # past a fold u can run back to 0 and end the scan there
+        while prev is None or 0.0 < u < 1.0:
+            if self.method == 'natural' or prev is None:
+                u_next = min(u + ds, 1.0)
+                if prev is None:
+                    guess = x
+                else:
+                    # secant predictor through the last two points
+                    guess = x + (x - prev[0]) * (u_next - u) / (u - prev[1])
+                x_next, iterations = self.solve_at(guess, u_next)
+            else:
+                x_next, u_next, iterations = self.arclength_step(x, u, prev, scale, ds)
+
+            if iterations is None:
+                if ds <= self.min_step:
+                    raise RuntimeError("continuation stalled at %s=%g" % (self.param, self.param_at(u)))
+                ds = max(ds * 0.5, self.min_step)
+                continue
+
+            prev = (x, u)
+            x, u = x_next, u_next
+            ds = self.adapt(ds, iterations)
+            yield CurvePoint(self.param_at(u), to_store(self.env, x), iterations)
+
+    def arclength_step(self, x, u, prev, scale, ds):
+        """One pseudo-arclength predictor/corrector step of length ds."""
+        y = np.append(x / scale, u)
+        tangent = y - np.append(prev[0] / scale, prev[1])
+        tangent /= np.linalg.norm(tangent)
+        y_pred = y + ds * tangent
+
+        for end in (0.0, 1.0):
+            if (y_pred[-1] - end) * (u - end) <= 0 and y_pred[-1] != u:
+                # last point: land exactly on the end of the range it leaves by
+                frac = (end - u) / (y_pred[-1] - u)
+                guess = x + frac * (y_pred[:-1] * scale - x)
+                x_next, iterations = self.solve_at(guess, end)
+                if iterations is not None and self.off_curve(y, y + frac * ds * tangent, np.append(x_next / scale, end), tangent, frac * ds):
+                    iterations = None
+                return x_next, end, iterations
+
+        def augmented(z):
+            return np.append(
+                self.residual_at(z[:-1] * scale, z[-1]),
+                np.dot(tangent, z - y_pred),
+            )
+
+        z, iterations = newton(augmented, y_pred, tol=self.tol, max_iter=self.max_iter)
+        if iterations is not None and self.off_curve(y, y_pred, z, tangent, ds):
+            iterations = None
+        return z[:-1] * scale, float(z[-1]), iterations
+
+    @staticmethod
+    def off_curve(y, y_pred, z, tangent, ds):
+        """
+        Whether the corrector left the branch it was following: it landed
+        further from the prediction than the step is long (likely on another
+        branch), or the curve turned back or by more than 60 degrees. The
+        caller retries with a smaller step.
+        """
+        step = z - y
+        return np.linalg.norm(z - y_pred) > ds or np.dot(tangent, step) <= 0.5 * np.linalg.norm(step)
+
+    def run(self):
+        """Run the whole scan and return the list of CurvePoints."""
+        return list(self)
+
+
+class CmdLine:
+    def scan(self, model, param, start, stop, method='natural', log=False, step=0.05):
+        """Print the equilibrium curve of model as param goes from start to stop."""
+        env = MODELS[model]()
+        cont = Continuation(env, param, start, stop, method=method, log=log, step=step)
+        for point in cont:
+            print("{}={:.6g} ({} its): {}".format(
+                param, point.param, point.iterations,
+                " ".join("%s=%.3f" % (key, val) for key, val in point.store.items()),
+            ))
+        print("balance evaluations:", cont.evaluations)
+
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire(CmdLine)
@@ -0,0 +1,184 @@
+"""
+Shared-memory domain decomposition of one large soil grid.
+
+A DecomposedColumn is MoonModel's layered soil taken much deeper and finer,
+over several columns side by side (one per latitude). The layer energies
+live in two `multiprocessing.shared_memory` buffers of shape
+(layers, columns), current and next. Each worker process owns a contiguous
+block of layers. Every step it
+
+- reads its block plus one halo layer above and below from the current
+  buffer (its neighbours' edge layers, read in place, not copied),
+- works out the fluxes across its interfaces from those temperatures; two
+  neighbours compute the flux across their shared interface from the same
+  values, so what one block loses the other gains exactly,
+- writes its block into the next buffer,
+
+and then waits at a barrier, after which the buffers swap roles. The worker
+owning the top layer also applies sunlight, earthshine and radiation.
+
+    grid = DecomposedColumn(layers=4000, layer_depth__m=0.0005,
+                            latitudes__deg=np.linspace(-80, 80, 64), workers=8)
+    grid.run(steps=10000, dt=10)
+    grid.temps__K[0]    # surface temperature of every column
+    grid.close()
+"""
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from real_moon import Constants, MoonModel
+
+
+def _advance_block(names, shape, rows, params, first, t0__s, steps, dt, barrier):
+    """Worker: advance layers rows[0]:rows[1] of the shared grid for steps steps, starting from buffer first."""
+    shms = [shared_memory.SharedMemory(name=name) for name in names]
+    try:
+        bufs = [np.ndarray(shape, dtype=np.float64, buffer=shm.buf) for shm in shms]
+        n_layers = shape[0]
+        a, b = rows
+        lo, hi = max(a - 1, 0), min(b + 1, n_layers)
+        C = params['heat_capacity__J_K']
+        G = params['conductance__W_K']
+        T_base = params['base_temp__K']
+
+        if a == 0:
+            mm = MoonModel(soil_layers=1, keep_logs=False, constants=params['constants'])
+            cos_lat = np.cos(np.radians(params['latitudes__deg']))
+            earthshine__W = params['constants'].earthshine__W_m2 * params['area__m2']
+            sigma_A = params['constants'].sb_constant__W_m2K4 * params['area__m2']
+
+        for k in range(steps):
+            cur = bufs[(first + k) % 2]
+            nxt = bufs[(first + k + 1) % 2]
+
+            # own block plus halo layers, straight from shared memory
+            temps__K = T_base + cur[lo:hi] / C
+            conducted__J = G * (temps__K[:-1] - temps__K[1:]) * dt
+
+            dJ = np.zeros((b - a, shape[1]))
+            # from the interface above each layer...
+            top = max(a, 1)
+            dJ[top - a:] += conducted__J[top - 1 - lo:b - 1 - lo]
+            # ...and out through the interface below it
+            last = min(b, n_layers - 1)
+            dJ[:last - a] -= conducted__J[a - lo:last - lo]
+
+            if a == 0:
+                mm.sum_dt = t0__s + k * dt
+                radiative_input__W = mm.solar_input__W_m2 * params['area__m2'] * cos_lat + earthshine__W
+                dJ[0] += (radiative_input__W - sigma_A * temps__K[0] ** 4) * dt
+
+            nxt[a:b] = cur[a:b] + dJ
+            barrier.wait()
+    except BaseException:
+        # release the other workers instead of leaving them at the barrier
+        barrier.abort()
+        raise
+    finally:
+        for shm in shms:
+            shm.close()
+
+
+class DecomposedColumn:
+    def __init__(self, layers=2000, layer_depth__m=0.001, latitudes__deg=(0,), workers=None,
+                 constants=Constants, initial_temp__K=250):
+        self.layers = layers
+        self.latitudes__deg = np.atleast_1d(np.asarray(latitudes__deg, dtype=float))
+        self.workers = min(workers or os.cpu_count() or 1, layers)
+        self.constants = constants
+
+        area__m2 = 1
+        self.params = {
+            'constants': constants,
+            'latitudes__deg': self.latitudes__deg,
+            'area__m2': area__m2,
+            'base_temp__K': initial_temp__K,
+            'heat_capacity__J_K': constants.soil_density__kg_m3 * area__m2 * layer_depth__m * constants.soil_specific_heat__J_kgK,
+            'conductance__W_K': constants.soil_thermal_conductivity__W_mK * area__m2 / layer_depth__m,
+        }
+
+        # layer energies above initial_temp__K, current and next
+        self.shape = (layers, len(self.latitudes__deg))
+        nbytes = int(np.prod(self.shape)) * np.dtype(np.float64).itemsize
+        self.shms = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(2)]
+        self.bufs = [np.ndarray(self.shape, dtype=np.float64, buffer=shm.buf) for shm in self.shms]
+        for buf in self.bufs:
+            buf[:] = 0
+        self.current = 0
+
+        bounds = np.linspace(0, layers, self.workers + 1).astype(int)
+        self.blocks = list(zip(bounds[:-1], bounds[1:]))
+        self.sum_dt = 0
+        self.steps = 0
+
+    @property
+    def soil_layers_energy__J(self):
+        """Layer energies of every column, a view on shared memory: shape (layers, columns)."""
+        return self.bufs[self.current]
+
+    @property
+    def temps__K(self):
+        return self.params['base_temp__K'] + self.soil_layers_energy__J / self.params['heat_capacity__J_K']
+
+    def run(self, steps, dt=30):
+        """Advance the whole grid steps steps of dt seconds across the worker processes."""
+        # explicit conduction between thin layers oscillates and blows up past this
+        max_dt = self.params['heat_capacity__J_K'] / (2 * self.params['conductance__W_K'])
+        if dt > max_dt:
+            raise ValueError("dt of %gs is unstable for these layers, keep it under %gs" % (dt, max_dt))
+
+        barrier = multiprocessing.Barrier(len(self.blocks))
+        procs = [
+            multiprocessing.Process(
+                target=_advance_block,
+                args=(
+                    [shm.name for shm in self.shms], self.shape, rows, self.params,
+                    self.current, self.sum_dt, steps, dt, barrier,
+                ),
+            )
+            for rows in self.blocks
+        ]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        if any(proc.exitcode != 0 for proc in procs):
+            raise RuntimeError("a worker failed, grid state is undefined")
+
+        self.current = (self.current + steps) % 2
+        self.sum_dt += steps * dt
+        self.steps += steps
+
+    def close(self):
+        """Release the shared memory."""
+        self.bufs = []
+        for shm in self.shms:
+            shm.close()
+            shm.unlink()
+        self.shms = []
+
+
+class CmdLine:
+    def run(self, layers=2000, layer_depth__m=0.001, columns=16, workers=None, steps=1000, dt=30):
+        """Advance a grid of columns from pole to pole and print the surface temperatures."""
+        import time
+
+        grid = DecomposedColumn(
+            layers=layers, layer_depth__m=layer_depth__m,
+            latitudes__deg=np.linspace(-80, 80, columns), workers=workers,
+        )
+        try:
+            start = time.time()
+            grid.run(steps, dt=dt)
+            print("{} workers, {:.2f}s".format(grid.workers, time.time() - start))
+            print("surface T:", " ".join("%.0f" % t for t in grid.temps__K[0]))
+        finally:
+            grid.close()
+
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire(CmdLine)
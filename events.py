@@ -0,0 +1,173 @@
+"""
+Event scheduling for the soil column integrators.
+
+Instead of testing `mm.steps % 10000` and comparing whole elapsed days
+before and after every step, a Scheduler knows when the next event is due
+and cuts the step short to land on it exactly. Time events cost nothing
+between firings, and they fire at the right time whatever dt is.
+
+    Every(period__s)        output cadences, every period__s of simulated time
+    DayBoundary(days=1)     the end of every `days` planet days
+    ZenithCrossing(angle)   the sun crossing a zenith angle; Sunrise() and
+                            Sunset() are the -90 / +90 degree crossings
+    Threshold(fn, level)    fn(model) crossing level, e.g. the surface
+                            falling below 100 K. Its time is found by root
+                            finding on the state interpolated within the step.
+
+Thresholds are the only events evaluated every step, once per step.
+
+    events = Scheduler(mm)
+    events.add(Every(10000), lambda mm, t: print(mm.soil_temp__K(0)))
+    events.add(Threshold(lambda mm: mm.soil_temp__K(0), 100, direction='down'), on_cold)
+    events.run(until__s=3 * mm.day__s, dt=60)
+
+Callbacks are called as callback(model, time__s) after the step that
+reaches the event.
+"""
+import heapq
+import itertools
+import math
+
+
+class Every:
+    def __init__(self, period__s, offset__s=0):
+        if period__s <= 0:
+            raise ValueError("period must be positive, got %r" % period__s)
+        self.period__s = period__s
+        self.offset__s = offset__s
+
+    def next_time(self, model, after__s):
+        """First firing time strictly after after__s."""
+        n = math.floor((after__s - self.offset__s) / self.period__s) + 1
+        return self.offset__s + n * self.period__s
+
+
+class DayBoundary:
+    def __init__(self, days=1):
+        self.days = days
+
+    def next_time(self, model, after__s):
+        period__s = self.days * model.day__s
+        return (math.floor(after__s / period__s) + 1) * period__s
+
+
+class ZenithCrossing:
+    def __init__(self, angle__deg):
+        self.angle__deg = angle__deg
+
+    def next_time(self, model, after__s):
+        # the zenith angle grows 360 degrees per day from its starting value
+        start__deg = model.starting_conditions['solar_zenith_angle__deg']
+        per_deg__s = model.day__s / 360
+        n = math.floor((after__s / per_deg__s - (self.angle__deg - start__deg)) / 360) + 1
+        return ((self.angle__deg - start__deg) + 360 * n) * per_deg__s
+
+
+class Sunrise(ZenithCrossing):
+    def __init__(self):
+        super().__init__(-90)
+
+
+class Sunset(ZenithCrossing):
+    def __init__(self):
+        super().__init__(90)
+
+
+class Threshold:
+    def __init__(self, fn, level, direction='both', tol=1e-9, max_iter=30):
+        if direction not in ('up', 'down', 'both'):
+            raise ValueError("direction must be 'up', 'down' or 'both', got %r" % direction)
+        self.fn = fn
+        self.level = level
+        self.direction = direction
+        self.tol = tol
+        self.max_iter = max_iter
+
+    def crossed(self, before, after):
+        if self.direction in ('down', 'both') and before > self.level >= after:
+            return True
+        if self.direction in ('up', 'both') and before < self.level <= after:
+            return True
+        return False
+
+
+class Scheduler:
+    def __init__(self, model, stepper=None):
+        """stepper: anything with step(dt) advancing model, e.g. a MultiRateStepper; default the model."""
+        self.model = model
+        self.stepper = stepper if stepper is not None else model
+        self.queue = []
+        self.thresholds = []
+        self.order = itertools.count()
+
+    def add(self, event, callback):
+        if isinstance(event, Threshold):
+            self.thresholds.append([event, callback, event.fn(self.model)])
+        else:
+            time__s = event.next_time(self.model, self.model.sum_dt)
+            heapq.heappush(self.queue, (time__s, next(self.order), event, callback))
+        return event
+
+    def run(self, until__s, dt=1):
+        """Step the model up to simulated time until__s, firing events on the way."""
+        mm = self.model
+        while mm.sum_dt < until__s:
+            t0 = mm.sum_dt
+            target = min(t0 + dt, until__s)
+            if self.queue and self.queue[0][0] < target:
+                target = self.queue[0][0]
+
+            energies_before = mm.soil_layers_energy__J.copy() if self.thresholds else None
+            self.stepper.step(target - t0)
+            # land exactly on the target, whatever rounding the step's sum did
+            if abs(mm.sum_dt - target) <= 1e-9 * max(1.0, abs(target)):
+                mm.sum_dt = target
+
+            if self.thresholds:
+                self.check_thresholds(t0, energies_before)
+
+            while self.queue and self.queue[0][0] <= mm.sum_dt:
+                time__s, _, event, callback = heapq.heappop(self.queue)
+                callback(mm, time__s)
+                heapq.heappush(self.queue, (event.next_time(mm, time__s), next(self.order), event, callback))
+
+    def check_thresholds(self, t0, energies_before):
+        mm = self.model
+        t1 = mm.sum_dt
+        for entry in self.thresholds:
+            event, callback, before = entry
+            after = event.fn(mm)
+            entry[2] = after
+            if event.crossed(before, after):
+                callback(mm, self.locate(event, t0, t1, energies_before, before, after))
+
+    def locate(self, event, t0, t1, energies_before, before, after):
+        """
+        Time within the last step at which event.fn crossed its level, by
+        regula falsi on the layer energies interpolated across the step.
+        """
+        mm = self.model
+        energies_after = mm.soil_layers_energy__J.copy()
+        sum_dt = mm.sum_dt
+
+        lo, hi = 0.0, 1.0
+        g_lo, g_hi = before - event.level, after - event.level
+        s = lo - g_lo * (hi - lo) / (g_hi - g_lo)
+        try:
+            for _ in range(event.max_iter):
+                s = lo - g_lo * (hi - lo) / (g_hi - g_lo)
+                mm.soil_layers_energy__J[:] = energies_before + s * (energies_after - energies_before)
+                mm.sum_dt = t0 + s * (t1 - t0)
+                mm._derived_at = None
+                g = event.fn(mm) - event.level
+                if abs(g) <= event.tol or hi - lo <= event.tol:
+                    break
+                if (g > 0) == (g_lo > 0):
+                    lo, g_lo = s, g
+                else:
+                    hi, g_hi = s, g
+        finally:
+            mm.soil_layers_energy__J[:] = energies_after
+            mm.sum_dt = sum_dt
+            mm._derived_at = None
+        return float(t0 + s * (t1 - t0))
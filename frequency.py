@@ -0,0 +1,159 @@
+"""
+Frequency-domain solution of the periodic soil column.
+
+With constant conductivity and specific heat, conduction through the layers
+of MoonModel / EarthModel is linear; only the surface radiation sigma T^4 is
+not. So over one day the column is solved exactly, harmonic by harmonic:
+
+    (i w C - L) T_k = e_0 q_k
+
+where C is the layer heat capacity, L the layer conduction operator (bottom
+insulated, as in the models), and q the net surface flux (radiative input
+minus radiation). Its surface entry gives the transfer function H(w) from
+surface flux to surface temperature. The mean (w = 0) is pinned by the
+condition that an insulated column takes in no net energy over a day.
+
+Only the surface temperature samples are iterated on, with Newton on
+
+    T - mean(T) - H * q(T) + mean(q(T)) / h = 0
+
+(h a typical radiative conductance 4 sigma T^3). That gives the equilibrium
+diurnal cycle directly, without stepping through the millions of seconds of
+spin-up, and serves as a reference for the time-domain integrators:
+
+    cycle = periodic_cycle(MoonModel())
+    seed_model(mm, cycle)   # start a time-domain run on the cycle
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class PeriodicCycle:
+    times__s: np.ndarray
+    # surface temperature at times__s
+    surface_temps__K: np.ndarray
+    # (layers, times) temperature of every layer
+    layer_temps__K: np.ndarray
+    radiative_input__W: np.ndarray
+    iterations: int
+
+
+def radiative_input(model, times__s):
+    """Sample the model's radiative input at times__s without stepping it."""
+    sum_dt = model.sum_dt
+    try:
+        inputs__W = []
+        for t in times__s:
+            model.sum_dt = t
+            inputs__W.append(model.radiative_input__W)
+    finally:
+        model.sum_dt = sum_dt
+        model._derived_at = None
+    return np.array(inputs__W)
+
+
+def layer_responses(model, n_samples):
+    """
+    Temperature of every layer per watt of surface flux, for each harmonic
+    of the day: shape (harmonics, layers). The mean harmonic is zero.
+    """
+    n_layers = len(model.soil_layers_energy__J)
+    C = model.soil_layer_heat_capacity__J_K
+    G = model.soil_layer_conductance__W_K
+
+    L = np.zeros((n_layers, n_layers))
+    for i in range(n_layers - 1):
+        L[i, i] -= G
+        L[i + 1, i + 1] -= G
+        L[i, i + 1] += G
+        L[i + 1, i] += G
+
+    e0 = np.zeros(n_layers)
+    e0[0] = 1
+    responses = np.zeros((n_samples // 2 + 1, n_layers), dtype=complex)
+    for k in range(1, n_samples // 2 + 1):
+        omega = 2 * np.pi * k / model.day__s
+        responses[k] = np.linalg.solve(1j * omega * C * np.eye(n_layers) - L, e0)
+    return responses
+
+
+def periodic_cycle(model, n_samples=512, tol=1e-6, max_iter=50):
+    """
+    Equilibrium daily cycle of model's soil column, sampled at n_samples
+    evenly spaced times from the model's start of day.
+    """
+    A = model.soil_layer_width__m * model.soil_layer_length__m
+    sigma_A = model.constants.sb_constant__W_m2K4 * A
+
+    times__s = np.arange(n_samples) * model.day__s / n_samples
+    inputs__W = radiative_input(model, times__s)
+    responses = layer_responses(model, n_samples)
+
+    # surface transfer function as a circulant matrix over the samples
+    impulse = np.fft.irfft(responses[:, 0], n=n_samples)
+    idx = np.arange(n_samples)
+    H = impulse[(idx[:, None] - idx[None, :]) % n_samples]
+
+    temps__K = np.full(n_samples, (np.mean(inputs__W) / sigma_A) ** 0.25)
+    h = 4 * sigma_A * temps__K[0] ** 3
+    eye = np.eye(n_samples)
+
+    def residual(temps__K):
+        q = inputs__W - sigma_A * temps__K ** 4
+        return temps__K - np.mean(temps__K) - np.fft.irfft(responses[:, 0] * np.fft.rfft(q), n=n_samples) + np.mean(q) / h
+
+    f = residual(temps__K)
+    for it in range(1, max_iter + 1):
+        if np.max(np.abs(f)) < tol:
+            break
+
+        dq = -4 * sigma_A * temps__K ** 3
+        jac = eye - 1 / n_samples - H * dq[None, :] + dq[None, :] / (n_samples * h)
+        step = np.linalg.solve(jac, -f)
+
+        # halve the step until the residual drops and temperatures stay positive
+        lam = 1.0
+        while True:
+            new_temps__K = temps__K + lam * step
+            if np.all(new_temps__K > 0):
+                new_f = residual(new_temps__K)
+                if np.linalg.norm(new_f) < np.linalg.norm(f) or lam < 1e-3:
+                    break
+            lam /= 2
+        temps__K, f = new_temps__K, new_f
+    else:
+        raise RuntimeError("periodic cycle did not converge, residual %.3g K" % np.max(np.abs(f)))
+
+    q_hat = np.fft.rfft(inputs__W - sigma_A * temps__K ** 4)
+    layer_temps__K = np.mean(temps__K) + np.fft.irfft(responses * q_hat[:, None], n=n_samples, axis=0).T
+
+    return PeriodicCycle(times__s, temps__K, layer_temps__K, inputs__W, it)
+
+
+def seed_model(model, cycle, sample=0):
+    """Set model's layer energies to the cycle's state at the given sample."""
+    temps__K = cycle.layer_temps__K[:, sample]
+    model.soil_layers_energy__J[:] = (temps__K - model.starting_conditions['soil_temp__K']) * model.soil_layer_heat_capacity__J_K
+    model._derived_at = None
+
+
+class CmdLine:
+    def cycle(self, model='moon', n_samples=512):
+        """Print the equilibrium daily surface temperature cycle."""
+        from real_earth import EarthModel
+        from real_moon import MoonModel
+
+        mm = {'moon': MoonModel, 'earth': EarthModel}[model](keep_logs=False)
+        cycle = periodic_cycle(mm, n_samples=n_samples)
+        print("converged in", cycle.iterations, "iterations")
+        print("surface T min {:.1f}K max {:.1f}K mean {:.1f}K".format(
+            cycle.surface_temps__K.min(), cycle.surface_temps__K.max(), cycle.surface_temps__K.mean(),
+        ))
+        print("layer means:", " ".join("%.0f" % t for t in cycle.layer_temps__K.mean(axis=1)))
+
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire(CmdLine)
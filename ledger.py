@@ -0,0 +1,118 @@
+"""
+Energy conservation auditing.
+
+EnergyLedger keeps running, Kahan-compensated totals of the joules entering
+a soil column model (sunlight plus earthshine) and leaving it (radiation from
+the top layer). Every `check_every` records it compares them with the energy
+stored in the layers; any difference beyond round-off means the integrator
+is creating or losing energy.
+
+    mm = MoonModel()
+    mm.ledger = EnergyLedger(mm)
+    for _ in range(100000):
+        mm.step()
+    print(mm.ledger.drift__J)
+
+Recording is two compensated additions per step, so the ledger can stay on
+in production runs.
+
+For the node solvers, balance_residual checks that the `balance_*` equations
+only move energy between nodes: summed over all nodes they must equal the
+external sources minus the external sinks, whatever the store.
+"""
+import math
+import warnings
+
+
+class EnergyDriftError(RuntimeError):
+    pass
+
+
+class KahanSum:
+    """Running sum with Kahan compensation for the low-order bits."""
+    __slots__ = ('total', 'compensation')
+
+    def __init__(self):
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def add(self, value):
+        y = value - self.compensation
+        t = self.total + y
+        self.compensation = (t - self.total) - y
+        self.total = t
+
+
+class EnergyLedger:
+    """
+    Running energy ledger of one soil column model.
+
+    on_drift is 'raise' (EnergyDriftError) or 'warn' (RuntimeWarning) when
+    |drift| exceeds rel_tol times the largest of the totals.
+    """
+
+    def __init__(self, model, check_every=10000, rel_tol=1e-9, on_drift='raise'):
+        if on_drift not in ('raise', 'warn'):
+            raise ValueError("on_drift must be 'raise' or 'warn', got %r" % on_drift)
+
+        self.model = model
+        self.check_every = check_every
+        self.rel_tol = rel_tol
+        self.on_drift = on_drift
+
+        self.energy_in__J = KahanSum()
+        self.energy_out__J = KahanSum()
+        self.stored_at_start__J = self.stored__J
+        self.records = 0
+        self.checks = 0
+        self.max_drift__J = 0.0
+
+    @property
+    def stored__J(self):
+        """Energy held in the model's layers right now."""
+        return math.fsum(self.model.soil_layers_energy__J)
+
+    @property
+    def drift__J(self):
+        """Stored energy gained beyond what came in and went out."""
+        return (self.stored__J - self.stored_at_start__J) - (self.energy_in__J.total - self.energy_out__J.total)
+
+    def record(self, energy_in__J, energy_out__J):
+        """Book one step's joules in and out; check for drift every check_every records."""
+        self.energy_in__J.add(energy_in__J)
+        self.energy_out__J.add(energy_out__J)
+        self.records += 1
+        if self.records % self.check_every == 0:
+            self.check()
+
+    def check(self):
+        """Compare the ledger with the stored energy, and raise or warn on drift."""
+        drift__J = self.drift__J
+        self.checks += 1
+        self.max_drift__J = max(self.max_drift__J, abs(drift__J))
+
+        scale__J = max(self.energy_in__J.total, self.energy_out__J.total, abs(self.stored__J), 1.0)
+        if abs(drift__J) > self.rel_tol * scale__J:
+            msg = "energy drift of {:.6g} J after {} records ({:.3g} of {:.6g} J booked)".format(
+                drift__J, self.records, abs(drift__J) / scale__J, scale__J,
+            )
+            if self.on_drift == 'raise':
+                raise EnergyDriftError(msg)
+            warnings.warn(msg, RuntimeWarning)
+        return drift__J
+
+
+def balance_residual(env, store):
+    """
+    Energy a node solver creates or loses at store, in W.
+
+    Sums the balance of every node and subtracts the external sources minus
+    sinks declared on the solver; the internal flows should cancel to
+    round-off.
+    """
+    total__W = math.fsum(getattr(env, name)(store) for name in env.balances.values())
+    external__W = math.fsum(
+        [getattr(env, name)(store) for name in env.sources]
+        + [-getattr(env, name)(store) for name in env.sinks]
+    )
+    return total__W - external__W
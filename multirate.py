@@ -0,0 +1,98 @@
+"""
+Multi-rate stepping for the soil column models.
+
+The top layer of `MoonModel` answers to sunlight and its own radiation within
+seconds to minutes, while the deep layers barely move over a synodic day. The
+MultiRateStepper subcycles the near-surface ("fast") layers with small steps
+and moves the deep layers once per large step:
+
+- at the start of a macro step of dt seconds, the deep temperatures are
+  frozen and the conduction between deep layers is evaluated once;
+- the fast layers take `substeps` steps of dt / substeps, each with the
+  surface input and radiation at that time, conducting into the frozen top
+  deep layer and adding up the joules that cross that interface;
+- the deep layers then take one step, the top deep layer receiving exactly
+  the joules the fast layers gave off, so the column conserves energy.
+
+Works for any model with the MoonModel layer interface (EarthModel too).
+The per-step `vars_logs` are not written; day means are kept as usual.
+
+    mm = MoonModel(keep_logs=False)
+    stepper = MultiRateStepper(mm, fast_layers=2, substeps=60)
+    while mm.elapsed__moon_days < 1:
+        stepper.step(dt=600)
+"""
+
+
+class MultiRateStepper:
+    def __init__(self, model, fast_layers=2, substeps=60):
+        if not 0 < fast_layers < len(model.soil_layers_energy__J):
+            raise ValueError("fast_layers must leave at least one deep layer, got %r" % fast_layers)
+        if substeps < 1:
+            raise ValueError("substeps must be at least 1, got %r" % substeps)
+
+        self.model = model
+        self.fast_layers = fast_layers
+        self.substeps = substeps
+
+        # evaluations of a layer's net flux, to compare against single-rate stepping
+        self.flux_evaluations = 0
+
+    def step(self, dt=600):
+        """Step the model by dt seconds: substeps for the fast layers, one for the deep ones."""
+        mm = self.model
+        n_fast = self.fast_layers
+        h = dt / self.substeps
+
+        A = mm.soil_layer_width__m * mm.soil_layer_length__m
+        G = mm.soil_layer_conductance__W_K
+        C = mm.soil_layer_heat_capacity__J_K
+        sigma = mm.constants.sb_constant__W_m2K4
+        T_base = mm.starting_conditions['soil_temp__K']
+
+        # deep layers: frozen for the whole macro step
+        temps__K = mm.soil_temps__K()
+        deep_top__K = temps__K[n_fast]
+        deep_conducted__J = mm.conduction__W(temps__K[n_fast:]) * dt
+
+        # fast layers: plain floats, the substep loop is too short for numpy to pay off
+        energies__J = mm.soil_layers_energy__J[:n_fast].tolist()
+        interface__J = 0.0
+        energy_in__J = 0.0
+        energy_out__J = 0.0
+        for _ in range(self.substeps):
+            temps = [T_base + e / C for e in energies__J]
+
+            radiative_input__W = mm.radiative_input__W
+            soil_radiation__W = sigma * temps[0]**4 * A
+
+            energies__J[0] += (radiative_input__W - soil_radiation__W) * h
+            for i in range(n_fast - 1):
+                conducted__J = G * (temps[i] - temps[i + 1]) * h
+                energies__J[i] -= conducted__J
+                energies__J[i + 1] += conducted__J
+            conducted__J = G * (temps[n_fast - 1] - deep_top__K) * h
+            energies__J[n_fast - 1] -= conducted__J
+            interface__J += conducted__J
+
+            energy_in__J += radiative_input__W * h
+            energy_out__J += soil_radiation__W * h
+            mm._accumulate_day(radiative_input__W, soil_radiation__W, T_base + energies__J[0] / C, h)
+            mm.sum_dt += h
+            if mm.sum_dt >= mm.day_end__s:
+                mm._end_day()
+
+        mm.soil_layers_energy__J[:n_fast] = energies__J
+        mm.soil_layers_energy__J[n_fast] += interface__J
+        mm.soil_layers_energy__J[n_fast:-1] -= deep_conducted__J
+        mm.soil_layers_energy__J[n_fast + 1:] += deep_conducted__J
+        # booked once per macro step, when the column adds up again
+        if mm.ledger is not None:
+            mm.ledger.record(energy_in__J, energy_out__J)
+
+        # the substeps derived radiation from the stale top layer energy
+        mm._derived_at = None
+        mm.steps += 1
+        mm.steps_day += 1
+
+        self.flux_evaluations += n_fast * self.substeps + len(mm.soil_layers_energy__J) - n_fast
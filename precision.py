@@ -0,0 +1,129 @@
+"""
+Precision policies for the soil column models.
+
+A Precision says which dtype the layer state and the per-second logs are
+stored in. Whatever the policy, the model computes in float64 where
+round-off adds up: the day-mean sums, the temperatures and T^4 radiation,
+and the energy ledger.
+
+    FULL   float64 everywhere, the default
+    MIXED  float32 logs: halves the ~60 MB of vars_logs per moon model,
+           the state and thus the physics stay float64
+    LOW    float32 state as well, for large gridded runs where memory
+           bandwidth dominates. A float32 layer holding ~1e7 J rounds away
+           part of every step's joules, so the column slowly gains or loses
+           energy; an EnergyLedger (float64) measures how much, and the
+           report shows it for the run length and dt you use
+
+report() runs a model under each policy next to FULL and measures the
+differences, by default until just past the first day boundary:
+
+    python precision.py report --model earth
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class Precision:
+    state: type = np.float64
+    logs: type = np.float64
+    accumulate: type = np.float64
+
+
+FULL = Precision()
+MIXED = Precision(logs=np.float32)
+LOW = Precision(state=np.float32, logs=np.float32)
+
+POLICIES = {
+    'full': FULL,
+    'mixed': MIXED,
+    'low': LOW,
+}
+
+
+def state_nbytes(model):
+    """Bytes held in the model's layer energies and day sums."""
+    total = model.state.nbytes
+    if model.day_sums.base is not model.state:
+        total += model.day_sums.nbytes
+    return total
+
+
+def log_nbytes(model):
+    """Bytes held in the model's per-second logs."""
+    if model.vars_logs is None:
+        return 0
+    return sum(vals.nbytes for vals in model.vars_logs.values())
+
+
+def report(model='moon', steps=None, dt=1, sample_every=100, policies=('mixed', 'low')):
+    """
+    Run model for steps steps of dt seconds under FULL and each policy and
+    compare them: surface temperature along the way, every layer at the end,
+    the rounded means of the finished days, the unrounded means of the day
+    in progress, energy drift and memory.
+
+    steps defaults to 5% of a day past the first day boundary; for the moon
+    at dt=1 that is 2.7 million steps per policy.
+    """
+    from ledger import EnergyLedger
+    from real_earth import EarthModel
+    from real_moon import MoonModel
+
+    model_cls = {'moon': MoonModel, 'earth': EarthModel}[model]
+    names = ['full'] + list(policies)
+    models = {name: model_cls(precision=POLICIES[name]) for name in names}
+    if steps is None:
+        steps = int(1.05 * models['full'].day__s / dt)
+    for mm in models.values():
+        mm.ledger = EnergyLedger(mm, check_every=steps + 1)
+
+    surface__K = {name: [] for name in names}
+    for i in range(steps):
+        for name, mm in models.items():
+            mm.step(dt)
+            if i % sample_every == 0:
+                surface__K[name].append(float(mm.soil_temp__K(0)))
+
+    def day_means(mm):
+        return mm.day_sums / mm.day_elapsed__s
+
+    ref = models['full']
+    results = {}
+    for name, mm in models.items():
+        results[name] = {
+            'state_bytes': state_nbytes(mm),
+            'log_bytes': log_nbytes(mm),
+            'max_surface_diff__K': float(np.max(np.abs(np.subtract(surface__K[name], surface__K['full'])))),
+            'max_layer_diff__K': float(np.max(np.abs(mm.soil_temps__K().astype(float) - ref.soil_temps__K()))),
+            'day_means_diff': {
+                key: [a - b for a, b in zip(mm.vars_logs_day_means[key], ref.vars_logs_day_means[key])]
+                for key in ref.vars_logs_day_means
+            },
+            'day_in_progress_means_diff': {
+                key: float(a - b) for key, a, b in zip(ref.vars_logs_day_means, day_means(mm), day_means(ref))
+            },
+            'energy_drift__J': mm.ledger.drift__J,
+            'energy_booked__J': mm.ledger.energy_in__J.total,
+        }
+    return results
+
+
+class CmdLine:
+    def report(self, model='moon', steps=None, dt=1):
+        """Print how far the reduced-precision policies stray from float64."""
+        for name, res in report(model=model, steps=steps, dt=dt).items():
+            print("{:>5}: state {} B, logs {:.1f} MB, surface T off by up to {:.2e}K, layers by {:.2e}K, "
+                  "energy drift {:.3g}J of {:.3g}J in, day means off by {}, this day's by {}".format(
+                      name, res['state_bytes'], res['log_bytes'] / 1e6,
+                      res['max_surface_diff__K'], res['max_layer_diff__K'],
+                      res['energy_drift__J'], res['energy_booked__J'], res['day_means_diff'],
+                      {key: "%.2e" % diff for key, diff in res['day_in_progress_means_diff'].items()},
+                  ))
+
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire(CmdLine)
@@ -1,6 +1,9 @@
 import math
 import numpy as np
 
+from events import DayBoundary, Every, Scheduler
+from precision import FULL
+
 
 class Constants:
     # synodic moon day: 29 days, 12 hours, 44 minutes, 3 seconds (wikipedia)
@@ -26,7 +29,41 @@ class Constants:
 
 
 class MoonModel:
-    def __init__(self):
+    # a model is a handful of slots around one state block (two when the
+    # precision stores the layers narrower than the day sums), so tens of
+    # thousands of them fit in one process
+    __slots__ = (
+        'constants',
+        'precision',
+        'starting_conditions',
+        'vars_logs',
+        'vars_logs_day_means',
+        'soil_layer_length__m',
+        'soil_layer_width__m',
+        'soil_layer_depth__m',
+        'soil_layer_weight__kg',
+        'soil_layer_heat_capacity__J_K',
+        'soil_layer_conductance__W_K',
+        'state',
+        'soil_layers_energy__J',
+        'day_sums',
+        'sum_dt',
+        'steps',
+        'steps_day',
+        'day_end__s',
+        'ledger',
+        '_derived_at',
+        '_solar_zenith_angle__deg',
+        '_solar_input__W_m2',
+        '_soil_radiation__W',
+    )
+
+    def __init__(self, soil_layers=20, keep_logs=True, constants=Constants, precision=FULL):
+        # a Constants subclass overriding some values gives a variant of the model
+        self.constants = constants
+        # dtypes of the layer state and logs, see precision.py
+        self.precision = precision
+
         # start
         self.starting_conditions = {
             # start at horizon
@@ -38,11 +75,13 @@ class MoonModel:
             'soil_temp__K': 3,
         }
 
+        # per-second logs of the current day; skip them with keep_logs=False
+        # when only the day means are needed
         self.vars_logs = {
-            'radiative_input_W': np.zeros(Constants.moon_day__s),
-            'soil_radiation_W': np.zeros(Constants.moon_day__s),
-            'avg_soil_temp__K': np.zeros(Constants.moon_day__s),
-        }
+            'radiative_input_W': np.zeros(self.constants.moon_day__s, dtype=precision.logs),
+            'soil_radiation_W': np.zeros(self.constants.moon_day__s, dtype=precision.logs),
+            'avg_soil_temp__K': np.zeros(self.constants.moon_day__s, dtype=precision.logs),
+        } if keep_logs else None
         self.vars_logs_day_means = {
             'radiative_input_W': [],
             'soil_radiation_W': [],
@@ -53,42 +92,104 @@ class MoonModel:
         self.soil_layer_length__m = 1
         self.soil_layer_width__m = 1
         self.soil_layer_depth__m = 0.1
-        self.soil_layer_weight__kg = Constants.soil_density__kg_m3 * (
+        self.soil_layer_weight__kg = self.constants.soil_density__kg_m3 * (
             self.soil_layer_length__m *
             self.soil_layer_width__m *
             self.soil_layer_depth__m
         )
-        self.soil_layers_energy__J = [0] * 20
+        self.soil_layer_heat_capacity__J_K = self.soil_layer_weight__kg * self.constants.soil_specific_heat__J_kgK
+        # conducted watts per kelvin of difference between neighbouring layers
+        self.soil_layer_conductance__W_K = self.constants.soil_thermal_conductivity__W_mK * (
+            self.soil_layer_width__m * self.soil_layer_length__m
+        ) / self.soil_layer_depth__m
+
+        # one block holds the layer energies followed by the running sums
+        # behind the day means, in the order of vars_logs_day_means; the sums
+        # get their own array when the layers are stored narrower than them
+        if np.dtype(precision.state) == np.dtype(precision.accumulate):
+            self.state = np.zeros(soil_layers + len(self.vars_logs_day_means), dtype=precision.state)
+            self.soil_layers_energy__J = self.state[:soil_layers]
+            self.day_sums = self.state[soil_layers:]
+        else:
+            self.state = np.zeros(soil_layers, dtype=precision.state)
+            self.soil_layers_energy__J = self.state
+            self.day_sums = np.zeros(len(self.vars_logs_day_means), dtype=precision.accumulate)
 
         self.sum_dt = 0
         self.steps = 0
         self.steps_day = 0
+        self.day_end__s = self.constants.moon_day__s
+
+        self._derived_at = None
+
+        # optional ledger.EnergyLedger booking every step's joules in and out
+        self.ledger = None
+
+    def _derive(self):
+        """
+        Compute the per-step derived quantities once per simulated time.
+
+        They are cached against sum_dt, which every step advances; the layer
+        energies only change inside step, so the cached radiation stays valid.
+        """
+        zenith__deg = self.starting_conditions['solar_zenith_angle__deg'] + self.sum_dt * 360 / self.constants.moon_day__s
+
+        insolation__W_m2 = self.constants.solar_constant__W_m2 * math.cos(math.radians(zenith__deg))
+        if insolation__W_m2 < 0:
+            # no sunlight at night
+            solar_input__W_m2 = 0
+        else:
+            solar_input__W_m2 = insolation__W_m2 * (1 - self.constants.lunar_albedo)
+
+        # T^4 in float64 whatever the state dtype
+        soil_radiation__W_m2 = self.constants.sb_constant__W_m2K4 * float(self.soil_temp__K(layer=0))**4
+
+        self._solar_zenith_angle__deg = zenith__deg
+        self._solar_input__W_m2 = solar_input__W_m2
+        self._soil_radiation__W = soil_radiation__W_m2 * (self.soil_layer_width__m * self.soil_layer_length__m)
+        self._derived_at = self.sum_dt
 
     @property
     def solar_zenith_angle__deg(self):
         """Get the solar zenith angle in degrees at this time step."""
-        return self.starting_conditions['solar_zenith_angle__deg'] + self.sum_dt * 360 / Constants.moon_day__s
+        if self._derived_at != self.sum_dt:
+            self._derive()
+        return self._solar_zenith_angle__deg
 
     @property
     def solar_input__W_m2(self):
         """Solar input at this time step."""
-        insolation__W_m2 = Constants.solar_constant__W_m2 * math.cos(math.radians(self.solar_zenith_angle__deg))
-        if insolation__W_m2 < 0:
-            # no sunlight at night
-            return 0
-
-        return insolation__W_m2 * (1 - Constants.lunar_albedo)
+        if self._derived_at != self.sum_dt:
+            self._derive()
+        return self._solar_input__W_m2
 
     def soil_temp__K(self, layer):
         """Get the soil temperature in Kelvin."""
-        temp_change__K = self.soil_layers_energy__J[layer] / (self.soil_layer_weight__kg * Constants.soil_specific_heat__J_kgK)
+        # in float64 whatever the state dtype
+        temp_change__K = np.float64(self.soil_layers_energy__J[layer]) / self.soil_layer_heat_capacity__J_K
         return self.starting_conditions['soil_temp__K'] + temp_change__K
 
+    def soil_temps__K(self):
+        """Get the soil temperature of every layer in Kelvin."""
+        energies__J = np.asarray(self.soil_layers_energy__J, dtype=np.float64)
+        return self.starting_conditions['soil_temp__K'] + energies__J / self.soil_layer_heat_capacity__J_K
+
+    def conduction__W(self, temps__K):
+        """Heat conducted down across each layer interface, given layer temperatures."""
+        return self.soil_layer_conductance__W_K * (temps__K[:-1] - temps__K[1:])
+
+    @property
+    def radiative_input__W(self):
+        """Sunlight plus earthshine reaching the top layer in W."""
+        A = self.soil_layer_width__m * self.soil_layer_length__m
+        return (self.solar_input__W_m2 + self.constants.earthshine__W_m2) * A
+
     @property
     def soil_radiation__W(self):
         """Get the soil radiation in W of topmost layer."""
-        soil_radiation__W_m2 = Constants.sb_constant__W_m2K4 * self.soil_temp__K(layer=0)**4
-        return soil_radiation__W_m2 * (self.soil_layer_width__m * self.soil_layer_length__m)
+        if self._derived_at != self.sum_dt:
+            self._derive()
+        return self._soil_radiation__W
 
     @property
     def elapsed__earth_days(self):
@@ -96,99 +197,119 @@ class MoonModel:
 
     @property
     def elapsed__moon_days(self):
-        return self.sum_dt / Constants.moon_day__s
+        return self.sum_dt / self.constants.moon_day__s
 
-    def step(self, dt=1):
-        """Step the model by dt seconds."""
-        # this many joules of solar input
-        solar_input__W = self.solar_input__W_m2 * (self.soil_layer_width__m * self.soil_layer_length__m)
-        solar_input__J = solar_input__W * dt
+    @property
+    def day__s(self):
+        """Length of the planet day in seconds, from the model's constants."""
+        return self.constants.moon_day__s
 
-        earthshine__W = Constants.earthshine__W_m2 * (self.soil_layer_width__m * self.soil_layer_length__m)
-        earthshine_input__J = earthshine__W * dt
+    @property
+    def day_elapsed__s(self):
+        """Seconds since the start of the current day."""
+        return self.sum_dt - (self.day_end__s - self.constants.moon_day__s)
 
-        self.vars_logs['radiative_input_W'][self.steps_day] = solar_input__W + earthshine__W
+    def step(self, dt=1):
+        """Step the model by dt seconds."""
+        if self._derived_at != self.sum_dt:
+            self._derive()
+        # this many joules of solar input and earthshine
+        radiative_input__W = self.radiative_input__W
+        radiative_input__J = radiative_input__W * dt
 
         # soil radiates according to its temperature across its top surface area
-        soil_radiation__J = self.soil_radiation__W * dt
-        self.vars_logs['soil_radiation_W'][self.steps_day] = self.soil_radiation__W
+        soil_radiation__W = self._soil_radiation__W
+        soil_radiation__J = soil_radiation__W * dt
 
         # update variables
         # first layer gets the sunlight
-        soil_layers__dJ = [0] * len(self.soil_layers_energy__J)
-        soil_layers__dJ[0] = solar_input__J + earthshine_input__J - soil_radiation__J
-        # rest of layers conduct downward
-        for layer_i in range(1, len(self.soil_layers_energy__J)):
-            # energy conducted is the difference in temperature between this layer and the one below
-            # multiplied by the thermal conductivity of the soil and the distance
-            A = self.soil_layer_width__m * self.soil_layer_length__m
-            dT = self.soil_temp__K(layer=layer_i - 1) - self.soil_temp__K(layer=layer_i)
-            dx = self.soil_layer_depth__m
-            conducted_down__J = Constants.soil_thermal_conductivity__W_mK * A * dT / dx
-            # earlier layer loses
-            soil_layers__dJ[layer_i - 1] -= conducted_down__J
-            # this layer gains
-            soil_layers__dJ[layer_i] += conducted_down__J
+        soil_layers__dJ = np.zeros(len(self.soil_layers_energy__J))
+        soil_layers__dJ[0] = radiative_input__J - soil_radiation__J
+        # rest of layers conduct downward: each layer loses what crosses its
+        # bottom interface to the one below
+        conducted_down__J = self.conduction__W(self.soil_temps__K()) * dt
+        soil_layers__dJ[:-1] -= conducted_down__J
+        soil_layers__dJ[1:] += conducted_down__J
 
         # update the soil values
-        for layer_i in range(len(self.soil_layers_energy__J)):
-            self.soil_layers_energy__J[layer_i] += soil_layers__dJ[layer_i]
-
-        self.vars_logs['avg_soil_temp__K'][self.steps_day] = self.soil_temp__K(layer=0)
+        self.soil_layers_energy__J += soil_layers__dJ
+        if self.ledger is not None:
+            self.ledger.record(radiative_input__J, soil_radiation__J)
+        top_temp__K = float(self.soil_temp__K(layer=0))
+
+        if self.vars_logs is not None:
+            # one slot per second of the day, whatever dt is; steps shorter
+            # than a second overwrite their slot, longer ones skip slots
+            second = int(self.day_elapsed__s)
+            self.vars_logs['radiative_input_W'][second] = radiative_input__W
+            self.vars_logs['soil_radiation_W'][second] = soil_radiation__W
+            self.vars_logs['avg_soil_temp__K'][second] = top_temp__K
+        self._accumulate_day(radiative_input__W, soil_radiation__W, top_temp__K, dt)
 
         # add to total time elapsed
-        pre_days = int(self.elapsed__moon_days)
         self.sum_dt += dt
         self.steps += 1
         self.steps_day += 1
-        post_days = int(self.elapsed__moon_days)
 
-        if post_days > pre_days:
-            for key, vals in self.vars_logs.items():
-                self.vars_logs_day_means[key].append(int(round(np.mean(vals))))
-                # clear vars logs
-                self.vars_logs[key] = np.zeros(len(vals))
+        if self.sum_dt >= self.day_end__s:
+            self._end_day()
+
+    def _accumulate_day(self, radiative_input__W, soil_radiation__W, top_temp__K, dt):
+        """Add dt seconds worth of the logged variables to the day sums."""
+        self.day_sums[0] += radiative_input__W * dt
+        self.day_sums[1] += soil_radiation__W * dt
+        self.day_sums[2] += top_temp__K * dt
+
+    def _end_day(self):
+        """Turn the day sums into day means and start the next day."""
+        for key, day_sum in zip(self.vars_logs_day_means, self.day_sums):
+            self.vars_logs_day_means[key].append(int(round(day_sum / self.constants.moon_day__s)))
+        self.day_sums[:] = 0
+        if self.vars_logs is not None:
+            # clear vars logs
+            for vals in self.vars_logs.values():
+                vals.fill(0)
 
-            self.steps_day = 0
+        self.steps_day = 0
+        self.day_end__s += self.constants.moon_day__s
 
 
 class CmdLine:
-    def run(self):
+    def run(self, dt=1):
         soil_temps = []
 
         mm = MoonModel()
-        while True:
-            pre_day = int(mm.elapsed__moon_days)
-            mm.step()
-            post_day = int(mm.elapsed__moon_days)
-
-            if mm.steps % 100 == 0:
-                soil_temps.append(mm.soil_temp__K(0))
-
-            if mm.steps % 10000 == 0:
-                print("{:.2f}d, dIns {:.0f}W, dROut {:.0f}W, soil T: [{}]K, daily avg tmps: {}K {}, avg insolation: {}, avg radiated out: {}".format(
-                    mm.elapsed__moon_days,
-                    mm.vars_logs['radiative_input_W'][mm.steps_day - 1],
-                    mm.vars_logs['soil_radiation_W'][mm.steps_day - 1],
-                    " ".join("%.0f" % mm.soil_temp__K(i) for i in range(len(mm.soil_layers_energy__J))),
-                    "%.0f" % np.mean(mm.vars_logs['avg_soil_temp__K'][:mm.steps_day]),
-                    mm.vars_logs_day_means['avg_soil_temp__K'],
-                    mm.vars_logs_day_means['radiative_input_W'],
-                    mm.vars_logs_day_means['soil_radiation_W'],
-                ))
-
-            if pre_day != post_day and post_day % 3 == 0:
-                # plot soil temps
-                import matplotlib.pyplot as plt
-                plt.plot(soil_temps)
-
-                # y axis from 0 to 400
-                plt.ylim(0, 400)
-
-                # add ticks every
-                plt.yticks(np.arange(0, 400, 20))
-
-                plt.show()
+
+        def print_status(mm, time__s):
+            print("{:.2f}d, dIns {:.0f}W, dROut {:.0f}W, soil T: [{}]K, daily avg tmps: {}K {}, avg insolation: {}, avg radiated out: {}".format(
+                mm.elapsed__moon_days,
+                mm.radiative_input__W,
+                mm.soil_radiation__W,
+                " ".join("%.0f" % mm.soil_temp__K(i) for i in range(len(mm.soil_layers_energy__J))),
+                "%.0f" % (mm.day_sums[2] / mm.day_elapsed__s if mm.day_elapsed__s else np.nan),
+                mm.vars_logs_day_means['avg_soil_temp__K'],
+                mm.vars_logs_day_means['radiative_input_W'],
+                mm.vars_logs_day_means['soil_radiation_W'],
+            ))
+
+        def plot_soil_temps(mm, time__s):
+            # plot soil temps
+            import matplotlib.pyplot as plt
+            plt.plot(soil_temps)
+
+            # y axis from 0 to 400
+            plt.ylim(0, 400)
+
+            # add ticks every
+            plt.yticks(np.arange(0, 400, 20))
+
+            plt.show()
+
+        events = Scheduler(mm)
+        events.add(Every(100), lambda mm, time__s: soil_temps.append(mm.soil_temp__K(0)))
+        events.add(Every(10000), print_status)
+        events.add(DayBoundary(days=3), plot_soil_temps)
+        events.run(until__s=math.inf, dt=dt)
 
 
 if __name__ == '__main__':
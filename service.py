@@ -0,0 +1,343 @@
+"""
+Local simulation service.
+
+Runs the planetary models (`real_moon`, `real_earth`) and the node solvers
+as jobs behind a small asyncio HTTP server, so a dashboard can share one
+compute box:
+
+    POST   /jobs              {"model": "moon", "params": {"days": 3}} -> {"id": ...}
+    GET    /jobs              all jobs and their state
+    GET    /jobs/<id>         state, latest progress and result of one job
+    GET    /jobs/<id>/events  progress and day means, streamed as JSON lines
+    DELETE /jobs/<id>         cancel a queued or running job
+
+Jobs are CPU bound, so they run in a process pool capped at `max_jobs`
+workers; further submissions wait in the queue until a worker frees up.
+Workers report back over a manager queue and check a manager event to
+honour cancellation.
+
+    python service.py serve --port 8765 --max_jobs 4
+    python service.py serve --unix /tmp/thermo.sock
+"""
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+
+import continuation
+import real_earth
+import real_moon
+
+
+PLANETS = {
+    'moon': (real_moon.MoonModel, 'elapsed__moon_days'),
+    'earth': (real_earth.EarthModel, 'elapsed__planet_days'),
+}
+
+
+class Cancelled(Exception):
+    pass
+
+
+def run_planet(model, params, progress, cancel):
+    """
+    Step a planetary model for params['days'] planet days.
+
+    Posts a 'progress' event every params['report_every'] steps and a
+    'day_mean' event at every day rollover.
+    """
+    model_cls, elapsed_attr = PLANETS[model]
+    days = params.get('days', 1)
+    report_every = params.get('report_every', 10000)
+
+    mm = model_cls(keep_logs=False)
+    while getattr(mm, elapsed_attr) < days:
+        mm.step()
+
+        if mm.steps_day == 0:
+            progress.put({
+                'type': 'day_mean',
+                'day': len(mm.vars_logs_day_means['avg_soil_temp__K']),
+                **{key: vals[-1] for key, vals in mm.vars_logs_day_means.items()},
+            })
+
+        if mm.steps % report_every == 0:
+            if cancel.is_set():
+                raise Cancelled()
+            progress.put({
+                'type': 'progress',
+                'elapsed_days': getattr(mm, elapsed_attr),
+                'steps': mm.steps,
+                'soil_temp__K': [mm.soil_temp__K(i) for i in range(len(mm.soil_layers_energy__J))],
+            })
+
+    return {
+        'elapsed_days': getattr(mm, elapsed_attr),
+        'steps': mm.steps,
+        'day_means': mm.vars_logs_day_means,
+        'soil_temp__K': [mm.soil_temp__K(i) for i in range(len(mm.soil_layers_energy__J))],
+    }
+
+
+def run_solver(model, params, progress, cancel):
+    """
+    Solve a node solver for its equilibrium store.
+
+    Any params matching solver attributes are set first. With a 'scan' entry
+    (keyword arguments of continuation.Continuation) the whole equilibrium
+    curve is walked and every point is posted as a 'curve_point' event.
+    """
+    env = continuation.MODELS[model]()
+    scan = params.get('scan')
+    for key, val in params.items():
+        if key != 'scan':
+            setattr(env, key, val)
+
+    if scan is None:
+        store, iterations = continuation.solve(env)
+        if iterations is None:
+            raise RuntimeError("no equilibrium found")
+        return {'store': store, 'iterations': iterations}
+
+    curve = []
+    for point in continuation.Continuation(env, **scan):
+        if cancel.is_set():
+            raise Cancelled()
+        point = {'param': point.param, 'store': point.store, 'iterations': point.iterations}
+        progress.put({'type': 'curve_point', **point})
+        curve.append(point)
+    return {'curve': curve}
+
+
+def run_job(model, params, progress, cancel):
+    """Process pool entry point; always posts None last so the reader can stop."""
+    try:
+        if model in PLANETS:
+            return run_planet(model, params, progress, cancel)
+        return run_solver(model, params, progress, cancel)
+    finally:
+        progress.put(None)
+
+
+class Job:
+    def __init__(self, job_id, model, params, manager):
+        self.id = job_id
+        self.model = model
+        self.params = params
+        self.state = 'queued'
+        self.events = []
+        self.result = None
+        self.error = None
+
+        self.progress = manager.Queue()
+        self.cancel_event = manager.Event()
+        self.changed = asyncio.Condition()
+        self.task = None
+
+    @property
+    def finished(self):
+        return self.state in ('done', 'failed', 'cancelled')
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'model': self.model,
+            'params': self.params,
+            'state': self.state,
+            'latest': self.events[-1] if self.events else None,
+            'result': self.result,
+            'error': self.error,
+        }
+
+    async def notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+
+class SimulationService:
+    def __init__(self, max_jobs=None):
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        # spawn, not fork: forked workers would inherit open client sockets
+        # and keep those connections from closing
+        context = multiprocessing.get_context('spawn')
+        self.pool = ProcessPoolExecutor(max_workers=self.max_jobs, mp_context=context)
+        self.slots = asyncio.Semaphore(self.max_jobs)
+        self.manager = context.Manager()
+        self.jobs = {}
+        self.ids = itertools.count(1)
+
+    def submit(self, model, params):
+        if not isinstance(model, str) or (model not in PLANETS and model not in continuation.MODELS):
+            raise ValueError("unknown model %r" % (model,))
+        if not isinstance(params, dict):
+            raise ValueError("params must be a JSON object, got %r" % (params,))
+
+        job = Job(str(next(self.ids)), model, params, self.manager)
+        self.jobs[job.id] = job
+        job.task = asyncio.ensure_future(self.execute(job))
+        return job
+
+    async def execute(self, job):
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.slots:
+                job.state = 'running'
+                await job.notify()
+                future = loop.run_in_executor(
+                    self.pool, run_job, job.model, job.params, job.progress, job.cancel_event,
+                )
+                await self.pump(job, future)
+                job.result = await future
+                job.state = 'done'
+        except (Cancelled, asyncio.CancelledError):
+            job.state = 'cancelled'
+        except Exception as e:
+            job.state = 'failed'
+            job.error = repr(e)
+        await job.notify()
+
+    async def pump(self, job, future):
+        """Move worker events from the manager queue into the job until the worker is done."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                event = await loop.run_in_executor(None, job.progress.get, True, 0.5)
+            except queue.Empty:
+                if future.done():
+                    return
+                continue
+            if event is None:
+                return
+            job.events.append(event)
+            await job.notify()
+
+    def cancel(self, job):
+        if job.state == 'queued':
+            job.task.cancel()
+        elif job.state == 'running':
+            # the worker notices at its next report
+            job.cancel_event.set()
+
+    async def stream(self, job):
+        """Yield every event of job, past and future, until it finishes."""
+        sent = 0
+        while True:
+            async with job.changed:
+                await job.changed.wait_for(lambda: len(job.events) > sent or job.finished)
+            while sent < len(job.events):
+                yield job.events[sent]
+                sent += 1
+            if job.finished and sent == len(job.events):
+                yield {'type': 'end', 'state': job.state, 'result': job.result, 'error': job.error}
+                return
+
+    def shutdown(self):
+        for job in self.jobs.values():
+            job.cancel_event.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.manager.shutdown()
+
+    # http
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode().split()
+            if len(request_line) < 2:
+                return
+            method, path = request_line[0], request_line[1]
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                key, _, val = line.partition(':')
+                headers[key.strip().lower()] = val.strip()
+
+            body = b''
+            if 'content-length' in headers:
+                body = await reader.readexactly(int(headers['content-length']))
+
+            await self.route(method, path.rstrip('/').split('/')[1:], body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, parts, body, writer):
+        if parts == ['jobs'] and method == 'POST':
+            try:
+                request = json.loads(body or b'{}')
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object, got %r" % (request,))
+                job = self.submit(request.get('model'), request.get('params', {}))
+            except ValueError as e:
+                return await respond(writer, 400, {'error': str(e)})
+            return await respond(writer, 202, {'id': job.id})
+
+        if parts == ['jobs'] and method == 'GET':
+            return await respond(writer, 200, [job.summary() for job in self.jobs.values()])
+
+        if len(parts) >= 2 and parts[0] == 'jobs':
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return await respond(writer, 404, {'error': 'no such job'})
+
+            if len(parts) == 2 and method == 'GET':
+                return await respond(writer, 200, job.summary())
+
+            if len(parts) == 2 and method == 'DELETE':
+                self.cancel(job)
+                return await respond(writer, 202, {'id': job.id, 'state': job.state})
+
+            if parts[2:] == ['events'] and method == 'GET':
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\n'
+                    b'Content-Type: application/x-ndjson\r\n'
+                    b'Connection: close\r\n\r\n'
+                )
+                async for event in self.stream(job):
+                    writer.write(json.dumps(event).encode() + b'\n')
+                    await writer.drain()
+                return
+
+        await respond(writer, 404, {'error': 'not found'})
+
+
+async def respond(writer, status, payload):
+    reasons = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found'}
+    body = json.dumps(payload).encode()
+    writer.write(
+        'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'.format(
+            status, reasons[status], len(body),
+        ).encode() + body
+    )
+    await writer.drain()
+
+
+class CmdLine:
+    def serve(self, host='127.0.0.1', port=8765, unix=None, max_jobs=None):
+        """Serve jobs over HTTP on host:port, or on a unix socket path."""
+        asyncio.run(self._serve(host, port, unix, max_jobs))
+
+    async def _serve(self, host, port, unix, max_jobs):
+        service = SimulationService(max_jobs=max_jobs)
+        if unix:
+            server = await asyncio.start_unix_server(service.handle, path=unix)
+            print("serving on", unix, "with", service.max_jobs, "workers")
+        else:
+            server = await asyncio.start_server(service.handle, host, port)
+            print("serving on http://%s:%s with %s workers" % (host, port, service.max_jobs))
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            service.shutdown()
+
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire(CmdLine)
@@ -14,6 +14,21 @@ class OnePlateWithConduction:
     L_plate = 0.01  # thickness of plate
     k_plate = 400  # conductivity of plate
 
+    # store key -> balance equation driving it
+    balances = {
+        'T_left': 'balance_left',
+        'T_right': 'balance_right',
+    }
+
+    # rates that bring energy in from outside / take it out of the system
+    sources = (
+        'rate_solar_input_left',
+    )
+    sinks = (
+        'rate_loss_to_space_left',
+        'rate_loss_to_space_right',
+    )
+
     # equations
     def rate_solar_input_left(self, store):
         return self.A_plate * self.F_left_sun * self.s_boltzmann * (
@@ -45,11 +60,14 @@ class OnePlateWithConduction:
         loss_right = self.rate_loss_to_space_right(store)
         return inp_right - loss_right
 
-    def solve(self):
-        store = {
+    def initial_store(self):
+        return {
             'T_left': 3,
             'T_right': 3,
         }
+
+    def solve(self):
+        store = self.initial_store()
         step = 0
         while True:
             joules_gain_left = self.balance_left(store)
@@ -75,18 +93,19 @@ class OnePlateWithConduction:
             store = new_store
 
 
-env = OnePlateWithConduction()
+if __name__ == '__main__':
+    env = OnePlateWithConduction()
 
-# # thin copper
-# env.L_plate = 0.01
-# env.k_plate = 400
+    # # thin copper
+    # env.L_plate = 0.01
+    # env.k_plate = 400
 
-# # thick marble
-# env.L_plate = 1.65
-# env.k_plate = 2.5
+    # # thick marble
+    # env.L_plate = 1.65
+    # env.k_plate = 2.5
 
-# almost no conduction
-env.L_plate = 1
-env.k_plate = 0.00001
+    # almost no conduction
+    env.L_plate = 1
+    env.k_plate = 0.00001
 
-env.solve()
+    env.solve()
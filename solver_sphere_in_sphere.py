@@ -8,21 +8,48 @@ class SphereInSphere:
     s_boltzmann = 5.67e-8
 
     A_ball = 1
-    r_ball = math.sqrt(A_ball / 4 / math.pi)
-
     A_inner = 2
     L_shell = 0.01
-    r_inner = math.sqrt(A_inner / 4 / math.pi)
-    r_outer = r_inner + L_shell
-    A_outer = 4 * math.pi * r_outer ** 2
 
     T_amb = 288
     Q_heatgen = 1000
     emissivity = 1
     k_ball = 45
 
+    # store key -> balance equation driving it
+    balances = {
+        'T_ball': 'balance_ball',
+        'T_inner': 'balance_inner',
+        'T_outer': 'balance_outer',
+    }
+
+    # rates that bring energy in from outside / take it out of the system
+    sources = (
+        'rate_ball_input',
+    )
+    sinks = (
+        'rate_outer_to_amb',
+    )
+
     step = 0
 
+    # geometry follows the areas and shell thickness, which may be arrays
+    @property
+    def r_ball(self):
+        return (self.A_ball / 4 / math.pi) ** 0.5
+
+    @property
+    def r_inner(self):
+        return (self.A_inner / 4 / math.pi) ** 0.5
+
+    @property
+    def r_outer(self):
+        return self.r_inner + self.L_shell
+
+    @property
+    def A_outer(self):
+        return 4 * math.pi * self.r_outer ** 2
+
     # equations
     def rate_ball_input(self, store):
         return self.Q_heatgen
@@ -59,12 +86,15 @@ class SphereInSphere:
         outp = self.rate_outer_to_amb(store)
         return inp - outp
 
-    def solve(self):
-        store = {
+    def initial_store(self):
+        return {
             'T_ball': 288,
             'T_inner': 288,
             'T_outer': 288,
         }
+
+    def solve(self):
+        store = self.initial_store()
         self.step = 0
         while True:
             joules_gain_ball = self.balance_ball(store)
@@ -83,5 +113,6 @@ class SphereInSphere:
             store = new_store
 
 
-env = SphereInSphere()
-env.solve()
+if __name__ == '__main__':
+    env = SphereInSphere()
+    env.solve()
@@ -17,6 +17,23 @@ class TwoPlatesWithConduction:
     # view factor between plates
     F_left_to_right = 1
 
+    # store key -> balance equation driving it
+    balances = {
+        'T1_left': 'balance_p1_left',
+        'T1_right': 'balance_p1_right',
+        'T2_left': 'balance_p2_left',
+        'T2_right': 'balance_p2_right',
+    }
+
+    # rates that bring energy in from outside / take it out of the system
+    sources = (
+        'rate_p1_solar_input_left',
+    )
+    sinks = (
+        'rate_p1_loss_to_space_left',
+        'rate_p2_loss_to_space_right',
+    )
+
     step = 0
 
     # equations
@@ -31,8 +48,6 @@ class TwoPlatesWithConduction:
         )
 
     def rate_p1_conduction_left_to_right(self, store):
-        if self.step % 100000 == 0:
-            print("cond left right:", self.A_plate, self.k_plate, store['T1_left'], store['T1_right'], self.L_plate)
         return self.A_plate * self.k_plate * (
             store['T1_left'] - store['T1_right']
         ) / self.L_plate
@@ -72,13 +87,16 @@ class TwoPlatesWithConduction:
         loss = self.rate_p2_loss_to_space_right(store)
         return inp - loss
 
-    def solve(self):
-        store = {
+    def initial_store(self):
+        return {
             'T1_left': 3,
             'T1_right': 3,
             'T2_left': 3,
             'T2_right': 3,
         }
+
+    def solve(self):
+        store = self.initial_store()
         self.step = 0
         while True:
             joules_gain_p1_left = self.balance_p1_left(store)
@@ -108,9 +126,10 @@ class TwoPlatesWithConduction:
             store = new_store
 
 
-env = TwoPlatesWithConduction()
+if __name__ == '__main__':
+    env = TwoPlatesWithConduction()
 
-env.L_plate = 0.01
-env.k_plate = 400
+    env.L_plate = 0.01
+    env.k_plate = 400
 
-env.solve()
+    env.solve()
@@ -0,0 +1,230 @@
+"""
+Reduced-order surrogate of the MoonModel surface temperature.
+
+Training runs the full layered model (through the multi-rate stepper) at
+every point of a parameter grid, e.g. soil conductivity x albedo. Each run
+starts on the column's equilibrium daily cycle from frequency.periodic_cycle,
+since a 2 m column takes some 150 moon days to settle from a uniform
+temperature, and keeps the surface temperature over the last simulated moon
+day sampled at `n_phases` times of day. The snapshots are compressed with POD: the mean
+curve plus the leading singular vectors, which keep all but `1 - energy` of
+the variance. A query interpolates the POD-filtered snapshots multilinearly
+over the grid and linearly in time of day. That is a few bisections and
+sums in plain Python, a few microseconds.
+
+The error estimate compares the surrogate at random points inside the grid
+with the full model at dt=1, started on the same equilibrium cycle, so the
+multi-rate stepping of the training runs is not in the reference. It is
+stored with the surrogate.
+
+    sur = SoilSurrogate.train({
+        'soil_thermal_conductivity__W_mK': [0.007, 0.014, 0.028],
+        'lunar_albedo': [0.05, 0.07, 0.12],
+    })
+    sur.validate(samples=4)
+    sur.save('moon_surface.npz')
+    SoilSurrogate.load('moon_surface.npz').surface_temp__K(0.25, lunar_albedo=0.1, soil_thermal_conductivity__W_mK=0.01)
+
+Time of day is the fraction of a synodic day since sunrise.
+"""
+import itertools
+import json
+from bisect import bisect_right
+
+import numpy as np
+
+from events import Every, Scheduler
+from frequency import periodic_cycle, seed_model
+from multirate import MultiRateStepper
+from real_moon import Constants, MoonModel
+
+
+def constants_for(params):
+    """Constants with params overridden; every name must be a Constants attribute."""
+    unknown = sorted(name for name in params if name.startswith('_') or not hasattr(Constants, name))
+    if unknown:
+        raise ValueError("not a Constants attribute: %s" % ", ".join(unknown))
+    return type('Constants', (Constants,), dict(params))
+
+
+def simulate(params, n_phases=96, days=1, dt=600, fast_layers=2, substeps=60):
+    """
+    Surface temperature over the last of `days` moon days of a full model run.
+
+    params override Constants; the soil starts on its equilibrium cycle.
+    Returns n_phases samples evenly spaced over the day, starting at sunrise.
+    """
+    mm = MoonModel(keep_logs=False, constants=constants_for(params))
+    seed_model(mm, periodic_cycle(mm))
+    stepper = MultiRateStepper(mm, fast_layers=fast_layers, substeps=substeps)
+
+    last_day__s = (days - 1) * mm.day__s
+    times__s = []
+    temps__K = []
+    while mm.sum_dt < days * mm.day__s:
+        stepper.step(dt)
+        if mm.sum_dt >= last_day__s:
+            times__s.append(mm.sum_dt - last_day__s)
+            temps__K.append(mm.soil_temp__K(0))
+
+    phases__s = np.arange(n_phases) * mm.day__s / n_phases
+    return np.interp(phases__s, times__s, temps__K, period=mm.day__s)
+
+
+def reference(params, n_phases=96):
+    """
+    Surface temperature over one moon day of MoonModel stepped at dt=1 from
+    its equilibrium cycle, at the same times of day as simulate().
+    """
+    mm = MoonModel(keep_logs=False, constants=constants_for(params))
+    seed_model(mm, periodic_cycle(mm))
+
+    temps__K = [mm.soil_temp__K(0)]
+    events = Scheduler(mm)
+    events.add(Every(mm.day__s / n_phases), lambda mm, time__s: temps__K.append(mm.soil_temp__K(0)))
+    events.run(until__s=mm.day__s - 1, dt=1)
+    return np.array(temps__K[:n_phases])
+
+
+class SoilSurrogate:
+    def __init__(self, names, grids, mean, modes, coeffs, error=None, simulate_kwargs=None):
+        self.names = list(names)
+        self.grids = [np.asarray(grid, dtype=float) for grid in grids]
+        self.mean = np.asarray(mean, dtype=float)
+        self.modes = np.asarray(modes, dtype=float)
+        self.coeffs = np.asarray(coeffs, dtype=float)
+        self.error = dict(error or {})
+        # how the training runs were made
+        self.simulate_kwargs = dict(simulate_kwargs or {})
+
+        # POD-filtered snapshots as nested lists, for fast scalar queries
+        self.n_phases = len(self.mean)
+        self._grids = [grid.tolist() for grid in self.grids]
+        self._table = (self.mean + self.coeffs @ self.modes).tolist()
+        self._strides = [int(np.prod([len(g) for g in self.grids[i + 1:]])) for i in range(len(self.grids))]
+
+    @classmethod
+    def train(cls, grid, energy=1 - 1e-9, **simulate_kwargs):
+        """
+        Run the full model at every point of grid ({param name: sorted values})
+        and fit the POD surrogate.
+        """
+        names = list(grid)
+        grids = [sorted(grid[name]) for name in names]
+        snapshots = np.array([
+            simulate(dict(zip(names, point)), **simulate_kwargs)
+            for point in itertools.product(*grids)
+        ])
+
+        mean = snapshots.mean(axis=0)
+        _, sing, modes = np.linalg.svd(snapshots - mean, full_matrices=False)
+        captured = np.cumsum(sing ** 2) / max(np.sum(sing ** 2), 1e-300)
+        rank = int(np.searchsorted(captured, energy) + 1) if len(sing) else 0
+        modes = modes[:rank]
+        coeffs = (snapshots - mean) @ modes.T
+
+        sur = cls(names, grids, mean, modes, coeffs, simulate_kwargs=simulate_kwargs)
+        sur.error['pod_truncation_rms__K'] = float(np.sqrt(np.mean((mean + coeffs @ modes - snapshots) ** 2)))
+        return sur
+
+    def surface_temp__K(self, phase, **params):
+        """Surface temperature at time of day phase (0..1 from sunrise) for params."""
+        # cell and weights along every parameter axis, clamped to the grid
+        corners = [(0, 1.0)]
+        for name, grid, stride in zip(self.names, self._grids, self._strides):
+            if len(grid) == 1:
+                continue
+            x = params[name]
+            i = min(max(bisect_right(grid, x) - 1, 0), len(grid) - 2)
+            w = min(max((x - grid[i]) / (grid[i + 1] - grid[i]), 0.0), 1.0)
+            corners = [
+                (idx + (i + j) * stride, wt * (w if j else 1 - w))
+                for idx, wt in corners
+                for j in (0, 1)
+            ]
+
+        # linear in time of day, wrapping around at sunrise
+        pos = (phase % 1.0) * self.n_phases
+        k = int(pos)
+        f = pos - k
+        k2 = (k + 1) % self.n_phases
+
+        temp__K = 0.0
+        for idx, wt in corners:
+            row = self._table[idx]
+            temp__K += wt * (row[k] + f * (row[k2] - row[k]))
+        return temp__K
+
+    def curve(self, **params):
+        """Surface temperature at every training time of day for params."""
+        return np.array([self.surface_temp__K(k / self.n_phases, **params) for k in range(self.n_phases)])
+
+    def validate(self, samples=4, seed=0):
+        """
+        Compare against reference() runs, the full model at dt=1, at random
+        points inside the grid and store the rms and max error in self.error.
+        A moon day at dt=1 takes the better part of a minute per sample.
+        """
+        rng = np.random.default_rng(seed)
+        errors = []
+        for _ in range(samples):
+            params = {name: float(rng.uniform(grid[0], grid[-1])) for name, grid in zip(self.names, self.grids)}
+            errors.append(self.curve(**params) - reference(params, n_phases=self.n_phases))
+        errors = np.array(errors)
+
+        self.error['validation_rms__K'] = float(np.sqrt(np.mean(errors ** 2)))
+        self.error['validation_max__K'] = float(np.max(np.abs(errors)))
+        self.error['validation_samples'] = samples
+        self.error['validation_reference_dt__s'] = 1
+        return self.error
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            names=np.array(self.names),
+            grid_sizes=np.array([len(grid) for grid in self.grids]),
+            grid_values=np.concatenate(self.grids),
+            mean=self.mean,
+            modes=self.modes,
+            coeffs=self.coeffs,
+            error_keys=np.array(list(self.error)),
+            error_values=np.array(list(self.error.values()), dtype=float),
+            simulate_kwargs=np.array(json.dumps(self.simulate_kwargs)),
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        bounds = np.cumsum(data['grid_sizes'])[:-1]
+        return cls(
+            names=data['names'].tolist(),
+            grids=np.split(data['grid_values'], bounds),
+            mean=data['mean'],
+            modes=data['modes'],
+            coeffs=data['coeffs'],
+            error=dict(zip(data['error_keys'].tolist(), data['error_values'].tolist())),
+            simulate_kwargs=json.loads(data['simulate_kwargs'].item()),
+        )
+
+
+class CmdLine:
+    def train(self, path, conductivities=(0.007, 0.014, 0.028), albedos=(0.05, 0.07, 0.12), days=1, validate=4):
+        """Train a conductivity x albedo surrogate and save it to path."""
+        sur = SoilSurrogate.train({
+            'soil_thermal_conductivity__W_mK': list(conductivities),
+            'lunar_albedo': list(albedos),
+        }, days=days)
+        if validate:
+            sur.validate(samples=validate)
+        sur.save(path)
+        print("modes:", len(sur.modes), "error:", sur.error)
+
+    def query(self, path, phase, **params):
+        """Surface temperature at time of day phase (0..1 from sunrise)."""
+        sur = SoilSurrogate.load(path)
+        print("%.2f K (error estimate: %s)" % (sur.surface_temp__K(phase, **params), sur.error))
+
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire(CmdLine)
@@ -13,6 +13,19 @@ class WallPlateSpace:
     L_plate = 1    # thickness
     k_plate = 400  # conductivity
 
+    # store key -> balance equation driving it
+    balances = {
+        'T_right': 'balance_right',
+    }
+
+    # rates that bring energy in from outside / take it out of the system
+    sources = (
+        'rate_conduction_left_to_right',
+    )
+    sinks = (
+        'rate_loss_to_space_right',
+    )
+
     # equations
     def rate_conduction_left_to_right(self, store):
         return self.A_plate * self.k_plate * (
@@ -29,10 +42,13 @@ class WallPlateSpace:
         loss_right = self.rate_loss_to_space_right(store)
         return inp_right - loss_right
 
-    def solve(self):
-        store = {
+    def initial_store(self):
+        return {
             'T_right': 3,
         }
+
+    def solve(self):
+        store = self.initial_store()
         step = 0
         while True:
             joules_gain_right = self.balance_right(store)
@@ -55,18 +71,19 @@ class WallPlateSpace:
             store = new_store
 
 
-env = WallPlateSpace()
+if __name__ == '__main__':
+    env = WallPlateSpace()
 
-# # copper
-# env.L_plate = 1
-# env.k_plate = 400
+    # # copper
+    # env.L_plate = 1
+    # env.k_plate = 400
 
-# # styrofoam
-# env.L_plate = 1
-# env.k_plate = 0.035
+    # # styrofoam
+    # env.L_plate = 1
+    # env.k_plate = 0.035
 
-# marble, matching radiative-equivalent
-env.L_plate = 1.65
-env.k_plate = 2.5
+    # marble, matching radiative-equivalent
+    env.L_plate = 1.65
+    env.k_plate = 2.5
 
-env.solve()
+    env.solve()